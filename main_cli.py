@@ -1,4 +1,5 @@
 import argparse
+import shlex
 import sys
 import os
 
@@ -78,7 +79,44 @@ def search_command_handler(args):
         print(f"Search operation failed: {e}")
         sys.exit(1)
 
-def main():
+def repl_command_handler(args):
+    # Interactive mode: the JVM, Lucene classloading and the searcher pool are
+    # paid once per process, so repeated searches skip the multi-second cold
+    # start a fresh 'python main_cli.py search ...' would pay every time.
+    print("\n--- Interactive mode ---")
+    print("Enter commands as on the command line (e.g. search \"John Lennon\"); 'exit' or Ctrl-D to quit.")
+    parser = build_parser()
+    while True:
+        try:
+            line = input("> ").strip()
+        except EOFError:
+            print()
+            break
+        if not line:
+            continue
+        if line in ("exit", "quit"):
+            break
+        try:
+            tokens = shlex.split(line)
+        except ValueError as e:
+            # e.g. unbalanced quotes; keep the session alive
+            print(f"Error: {e}")
+            continue
+        try:
+            repl_args = parser.parse_args(tokens)
+        except SystemExit:
+            # argparse already printed the usage/error message
+            continue
+        if repl_args.command == 'repl':
+            print("Already in interactive mode.")
+            continue
+        try:
+            repl_args.func(repl_args)
+        except SystemExit:
+            # Keep the session alive when a command handler bails out
+            pass
+
+def build_parser():
     parser = argparse.ArgumentParser(description="CLI")
     subparsers = parser.add_subparsers(dest='command', required=True, help='Available commands')
 
@@ -97,15 +135,16 @@ def main():
     search_parser.add_argument('query', type=str, help='The search query')
     search_parser.set_defaults(func=search_command_handler)
 
-    args = parser.parse_args()
-    
-    if args.command == 'merge':
-        if not args.nndb_path or not args.wiki_dump_path:
-            print("Error: --nndb-path and --wiki-dump-path are required for the 'merge' command.")
-            merge_parser.print_help()
-            sys.exit(1)
+    # --- REPL Command ---
+    repl_parser = subparsers.add_parser('repl', help='Interactive mode: run commands in one warm process')
+    repl_parser.set_defaults(func=repl_command_handler)
 
-    args.func(args) 
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    args.func(args)
 
 if __name__ == "__main__":
     main()